@@ -14,6 +14,9 @@ constexpr char PASSWORD[] = "Factorio";
 constexpr int UDP_PORT = 5005;
 constexpr unsigned long WIFI_TIMEOUT_MS = 10000;  // 10 seconds timeout
 constexpr unsigned long ACK_TIMEOUT_MS = 1000;     // 500ms timeout for acknowledgment
+// IP of the camera this buzzer belongs to. Alarms tagged with another camera
+// ("GUY_DEAD:<camera ip>") are ignored. Leave empty to react to every camera.
+constexpr char PAIRED_CAMERA_IP[] = "";
 
 AsyncUDP udp;
 IPAddress clientIP;
@@ -21,7 +24,20 @@ bool clientConnected = false;
 volatile bool ackReceived = false;  // Shared flag to track acknowledgment
 
 void handleUdpPacket(AsyncUDPPacket& packet) {
-    String data = (const char*)packet.data();
+    // The packet data is not null terminated
+    char buffer[64];
+    size_t length = min(packet.length(), sizeof(buffer) - 1);
+    memcpy(buffer, packet.data(), length);
+    buffer[length] = '\0';
+    String data = buffer;
+
+    // "COMMAND:<camera ip>" is only for the buzzer paired with that camera,
+    // a bare "COMMAND" is for every buzzer
+    int separator = data.indexOf(':');
+    if (separator >= 0 && strlen(PAIRED_CAMERA_IP) > 0
+        && data.substring(separator + 1) != PAIRED_CAMERA_IP) {
+      return;
+    }
 
     if (data.startsWith("GUY_ALIVE")) {
       notSleep();
@@ -9,13 +9,23 @@ PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # /mfw_sleep/trained
 TRAINED_MODELS_DIR = os.path.join(PROJECT_DIR, "trained")
-if not os.path.exists(TRAINED_MODELS_DIR):
-    os.makedirs(TRAINED_MODELS_DIR)
 
 # /mfw_sleep/output
 RECORDED_FRAMES_DIR = os.path.join(PROJECT_DIR, "output")
-if not os.path.exists(RECORDED_FRAMES_DIR):
-    os.makedirs(RECORDED_FRAMES_DIR)
+
+
+def user_frames_dir(user: str):
+    """/mfw_sleep/output/<user>, the recorded frames of a user."""
+    return os.path.join(RECORDED_FRAMES_DIR, user)
+
+
+# /mfw_sleep/logs
+PREDICTION_LOG_DIR = os.path.join(PROJECT_DIR, "logs")
+
+# Records per log file before rotating to a new one (32 bytes each)
+LOG_SEGMENT_RECORDS = 1 << 20
+# Oldest log files are deleted beyond this many (None keeps everything)
+LOG_MAX_SEGMENTS = None
 
 subfolders = {
     "open": 1,
@@ -33,6 +43,14 @@ batch_size = 16
 num_epochs = 10
 learning_rate = 0.001
 weight_decay = 0
+# Decoded images each training keeps in memory between epochs (about 192 KB
+# each, per parallel training). 0 decodes every image again in each epoch.
+TRAIN_CACHE_IMAGES = 0
+
+# Dummy inferences run on a freshly loaded model before real frames
+WARMUP_RUNS = 3
+# Seconds a run.py command may spend importing its modules before warning
+IMPORT_TIME_BUDGET = 2.0
 
 # If lower than this, the image is considered dark
 BRIGHTNESS_THRESHOLD_MIN = 50
@@ -53,7 +53,8 @@ class ESP32Cam:
         try:
             while True:
                 data, addr = self.sock.recvfrom(self.buffer_size)
-                if data.decode("utf-8") == "I_AM_THE_CAMERA":
+                # Image packets can still arrive from a previous session
+                if data.decode("utf-8", errors="ignore") == "I_AM_THE_CAMERA":
                     self.ip = addr[0]
                     print(f"ESP32-CAM found at {self.ip}. Starting handshake.")
                     break
@@ -65,19 +66,24 @@ class ESP32Cam:
         # Proceed with the handshake
         self.send("HELLO")
         self.sock.settimeout(5)
+        deadline = time.monotonic() + 5
         try:
-            data, addr = self.sock.recvfrom(self.buffer_size)
-            if data.decode("utf-8") == "ACK":
-                self.connected = True
-                print("Handshake successful. Connected to sender.")
-
-                # Start a thread to send periodic ACKs
-                threading.Thread(target=self._send_periodic_ack, daemon=True).start()
-            else:
-                print("Unexpected response during handshake.")
+            # Skip image packets until the ACK arrives
+            while time.monotonic() < deadline:
+                data, addr = self.sock.recvfrom(self.buffer_size)
+                if data.decode("utf-8", errors="ignore") == "ACK":
+                    self.connected = True
+                    print("Handshake successful. Connected to sender.")
+
+                    # Start a thread to send periodic ACKs
+                    threading.Thread(
+                        target=self._send_periodic_ack, daemon=True
+                    ).start()
+                    return
+            print("Unexpected response during handshake.")
         except socket.timeout:
             print("Handshake failed: No response from sender.")
-            self.connected = False
+        self.connected = False
 
     def _send_periodic_ack(self):
         """Send periodic ACK packets to keep the sender from timing out."""
@@ -88,7 +94,14 @@ class ESP32Cam:
     def receive_packets(self):
         """Receive and assemble image packets."""
         while self.connected:
-            data, addr = self.sock.recvfrom(self.buffer_size)
+            try:
+                data, addr = self.sock.recvfrom(self.buffer_size)
+            except socket.timeout:
+                print("No packets from ESP32-CAM. Disconnected.")
+                self.connected = False
+                self.current_packets = {}
+                self.expected_packets = 0
+                break
             header = data[: self.header_size]
             payload = data[self.header_size :]
 
@@ -135,7 +148,7 @@ class ESP32Cam:
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         return gray.mean()
 
-    def display_frames(self, record: bool = False):
+    def display_frames(self, record: bool = False, user: str | None = None):
         while True:
             frame_data = self.frame_queue.get()
             frame = self.process_frame(frame_data)
@@ -164,14 +177,17 @@ class ESP32Cam:
         cv2.destroyAllWindows()
         if record and self.current_state is not None:
             print("Recording frames")
-            self.save_frames()
+            self.save_frames(user)
 
-    def save_frames(self):
-        """Save collected frames to the output folder."""
+    def save_frames(self, user: str):
+        """Save collected frames to the user's folder in the output folder."""
         import os
         import shutil
 
-        output_dir = config.RECORDED_FRAMES_DIR
+        if not user:
+            # An empty name would clear every user's recordings
+            raise ValueError("A user is needed to save frames")
+        output_dir = config.user_frames_dir(user)
         if not os.path.exists(output_dir):
             print(f"Creating output directory: {output_dir}")
             os.makedirs(output_dir)
@@ -188,8 +204,10 @@ class ESP32Cam:
 
         print(f"Saved frames for states: {', '.join(self.frames.keys())}")
 
-    def stream(self, record=False):
-        """Start the streaming process."""
+    def stream(self, record=False, user: str | None = None):
+        """Start the streaming process. Recording needs the user to save frames for."""
+        if record and user is None:
+            raise ValueError("A user is needed to record frames")
         if not self.connected:
             print("Not connected to sender. Aborting stream.")
             return
@@ -197,11 +215,11 @@ class ESP32Cam:
         print("Starting stream")
         # Start threads for receiving packets and displaying frames
         threading.Thread(target=self.receive_packets, daemon=True).start()
-        self.display_frames(record)
+        self.display_frames(record, user)
 
 
-def main(esp: ESP32Cam):
-    esp.stream(record=True)
+def main(esp: ESP32Cam, user: str):
+    esp.stream(record=True, user=user)
 
 
 if __name__ == "__main__":
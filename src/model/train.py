@@ -1,20 +1,24 @@
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from PIL import Image
 from torch.utils.data import DataLoader, Dataset
-from torchvision import transforms
 
 import config
 
 
 class EyeDataset(Dataset):
-    def __init__(self, root_dir, subfolders, transform=None):
+    def __init__(self, root_dir, subfolders, transform=None, cache_size=0):
         self.data = []
         self.labels = []
         self.transform = transform
+        # Keep up to cache_size transformed images so later epochs skip decoding
+        # their files
+        self.cache = {}
+        self.cache_size = cache_size
 
         for subfolder, label in subfolders.items():
             folder_path = os.path.join(root_dir, subfolder)
@@ -31,12 +35,20 @@ class EyeDataset(Dataset):
         return len(self.data)
 
     def __getitem__(self, idx):
-        image_path = self.data[idx]
         label = self.labels[idx]
+        if idx in self.cache:
+            return self.cache[idx], torch.tensor(label, dtype=torch.float32)
+
+        # PIL and torchvision are only needed for training, not by the predictor
+        from PIL import Image
+
+        image_path = self.data[idx]
         image = Image.open(image_path).convert("RGB")
 
         if self.transform:
             image = self.transform(image)
+        if len(self.cache) < self.cache_size:
+            self.cache[idx] = image
 
         return image, torch.tensor(label, dtype=torch.float32)
 
@@ -65,24 +77,64 @@ class EyeOpennessModel(nn.Module):
         return x
 
 
-def main(user: str):
+def has_recordings(root_dir):
+    """Whether root_dir holds recorded images in any of the label subfolders."""
+    for subfolder in config.subfolders:
+        folder_path = os.path.join(root_dir, subfolder)
+        if os.path.isdir(folder_path) and any(
+            filename.lower().endswith((".png", ".jpg", ".jpeg"))
+            for filename in os.listdir(folder_path)
+        ):
+            return True
+    return False
+
+
+def save_model(model, user: str):
+    """Save the model so a running predictor never sees a partial file."""
+    os.makedirs(config.TRAINED_MODELS_DIR, exist_ok=True)
+    path = os.path.join(config.TRAINED_MODELS_DIR, f"{user}.pth")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def main(
+    user: str,
+    num_threads: int | None = None,
+    cache_size: int = config.TRAIN_CACHE_IMAGES,
+):
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
-    root_dir = config.RECORDED_FRAMES_DIR
+    root_dir = config.user_frames_dir(user)
+    if not os.path.exists(root_dir):
+        # Frames recorded before per-user directories
+        if not has_recordings(config.RECORDED_FRAMES_DIR):
+            raise FileNotFoundError(f"No recordings for {user} in {root_dir}")
+        root_dir = config.RECORDED_FRAMES_DIR
+        print(f"No recordings in {config.user_frames_dir(user)}, using {root_dir}")
     batch_size = config.batch_size
     num_epochs = config.num_epochs
     learning_rate = config.learning_rate
     weight_decay = config.weight_decay
 
+    from torchvision import transforms
+
+    # Images are loaded (and cached) as uint8 and scaled to [0, 1] per batch
     transform = transforms.Compose(
         [
             transforms.Resize((256, 256)),
-            transforms.ToTensor(),
+            transforms.PILToTensor(),
         ]
     )
 
-    dataset = EyeDataset(root_dir, config.subfolders, transform=transform)
+    dataset = EyeDataset(
+        root_dir, config.subfolders, transform=transform, cache_size=cache_size
+    )
+    if len(dataset) == 0:
+        raise FileNotFoundError(f"No recordings for {user} in {root_dir}")
 
     train_loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
 
@@ -97,7 +149,7 @@ def main(user: str):
         model.train()
         train_loss = 0.0
         for images, labels in train_loader:
-            images, labels = images.to(device), labels.to(device)
+            images, labels = images.to(device).float() / 255.0, labels.to(device)
             optimizer.zero_grad()
             outputs = model(images)
             loss = criterion(outputs.squeeze(), labels)
@@ -105,17 +157,56 @@ def main(user: str):
             optimizer.step()
             train_loss += loss.item()
 
-        print(
-            f"Epoch {epoch + 1}/{num_epochs}, Train Loss: {train_loss / len(train_loader):.4f}"
-        )
+        train_loss /= len(train_loader)
+        print(f"[{user}] Epoch {epoch + 1}/{num_epochs}, Train Loss: {train_loss:.4f}")
 
     print("Training complete.")
 
-    torch.save(
-        model.state_dict(), os.path.join(config.TRAINED_MODELS_DIR, f"{user}.pth")
-    )
+    save_model(model, user)
     print(f"Model saved as {user}.pth")
-
-
-if __name__ == "__main__":
-    main()
+    return train_loss
+
+
+def train_all(
+    users: list[str],
+    workers: int | None = None,
+    cache_size: int = config.TRAIN_CACHE_IMAGES,
+):
+    """Train a model for each user, several users at a time.
+
+    Each worker process gets an equal share of the CPU threads so that the
+    concurrent trainings do not compete for the same cores. Every worker keeps
+    its own image cache of up to `cache_size` images.
+
+    Returns the final loss of each trained user and the error of each user whose
+    training failed.
+    """
+    losses = {}
+    failed = {}
+    if not users:
+        print("No users to train")
+        return losses, failed
+
+    workers = min(workers or os.cpu_count() or 1, len(users))
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Training {len(users)} users with {workers} workers")
+
+    # Forked workers cannot use CUDA, spawned ones can
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(main, user, num_threads, cache_size): user
+            for user in users
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            user = futures[future]
+            try:
+                losses[user] = future.result()
+                print(
+                    f"[{done}/{len(users)}] {user} done, "
+                    f"Train Loss: {losses[user]:.4f}"
+                )
+            except Exception as e:
+                failed[user] = e
+                print(f"[{done}/{len(users)}] Training failed for {user}: {e}")
+    return losses, failed
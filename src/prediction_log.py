@@ -0,0 +1,266 @@
+import mmap
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import config
+
+# Fixed-width 32 byte record
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("device", "S16"),
+        ("prediction", "<f4"),
+        ("ir_status", "u1"),
+        ("alarm", "u1"),
+        ("padding", "V2"),
+    ]
+)
+
+
+class PredictionLog:
+    """Append-only log of predictions, split into memory-mapped segment files.
+
+    `log` only puts the record on a queue; a background thread copies queued
+    records into the current segment in batches, so the inference loop never
+    waits on the disk.
+
+    Segments are named after `name` (by default the process id) and the time of
+    their first record. Only segments with the same name count towards
+    `max_segments`, so predictors sharing a log directory never delete each
+    other's files. Records are kept in time order within a segment; if the clock
+    steps back, a new segment is started.
+    """
+
+    def __init__(
+        self,
+        name: str | None = None,
+        log_dir: str = config.PREDICTION_LOG_DIR,
+        segment_records: int = config.LOG_SEGMENT_RECORDS,
+        max_segments: int | None = config.LOG_MAX_SEGMENTS,
+        queue_size: int = 10000,
+    ):
+        self.name = writer_name(name or f"pid{os.getpid()}")
+        self.log_dir = log_dir
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+        self._file = None
+        self._mmap = None
+        self._records = None
+        self._count = 0
+        self._last_timestamp = 0.0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def log(
+        self,
+        device: str,
+        prediction: float,
+        ir_status: int | None = None,
+        alarm: bool = False,
+        timestamp: float | None = None,
+    ):
+        """Queue a record. Records are dropped if the writer falls behind."""
+        record = (
+            time.time() if timestamp is None else timestamp,
+            device.encode("utf-8")[:16],
+            prediction,
+            ir_status or 0,
+            alarm,
+        )
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out everything still queued and close the current segment."""
+        self._stop.set()
+        self._thread.join()
+        self._close_segment()
+
+    def _write_loop(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        batch.sort(key=lambda record: record[0])
+        while batch:
+            if (
+                self._records is None
+                or self._count == self.segment_records
+                or batch[0][0] < self._last_timestamp
+            ):
+                self._open_segment(batch[0][0])
+            n = min(len(batch), self.segment_records - self._count)
+            timestamps, *columns = zip(*batch[:n])
+            chunk = self._records[self._count : self._count + n]
+            for field, values in zip(
+                ("device", "prediction", "ir_status", "alarm"), columns
+            ):
+                chunk[field] = values
+            # A non-zero timestamp marks a record as written, so it goes last
+            chunk["timestamp"] = timestamps
+            # The view would keep the mmap from closing on rotation
+            del chunk
+            self._count += n
+            self._last_timestamp = timestamps[-1]
+            batch = batch[n:]
+
+    def _open_segment(self, first_timestamp: float):
+        self._close_segment()
+        os.makedirs(self.log_dir, exist_ok=True)
+        start = int(first_timestamp * 1e9)
+        while True:
+            path = os.path.join(self.log_dir, f"predictions_{self.name}_{start}.bin")
+            if not os.path.exists(path):
+                break
+            start += 1
+        self._file = open(path, "w+b")
+        self._file.truncate(self.segment_records * RECORD_DTYPE.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE)
+        self._count = 0
+        self._last_timestamp = first_timestamp
+        self._remove_old_segments()
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        # Release the numpy view before closing the map it points into
+        self._records = None
+        self._mmap.flush()
+        self._mmap.close()
+        # Drop the unused, zero-filled tail
+        self._file.truncate(self._count * RECORD_DTYPE.itemsize)
+        self._file.close()
+        self._file = None
+        self._mmap = None
+
+    def _remove_old_segments(self):
+        if self.max_segments is None:
+            return
+        segments = list_segments(self.log_dir, self.name)
+        for _, path in segments[: -self.max_segments]:
+            os.remove(path)
+
+
+def writer_name(name: str):
+    """Make a name usable in segment file names.
+
+    "_" separates the name from the time in the file name.
+    """
+    return name.replace("_", "-").replace(":", "-")
+
+
+def list_segments(log_dir: str = config.PREDICTION_LOG_DIR, name: str | None = None):
+    """Return (first record time, path) of the log segments, optionally of one
+    writer, oldest first."""
+    if not os.path.exists(log_dir):
+        return []
+
+    segments = []
+    for filename in os.listdir(log_dir):
+        if not (filename.startswith("predictions_") and filename.endswith(".bin")):
+            continue
+        # predictions_<name>_<ns>.bin
+        writer, _, ns = filename[len("predictions_") : -len(".bin")].rpartition("_")
+        if not ns.isdigit() or (name is not None and writer != name):
+            continue
+        segments.append((int(ns) / 1e9, os.path.join(log_dir, filename)))
+    segments.sort()
+    return segments
+
+
+def load_segment(path: str):
+    """Memory-map a segment and return its written records."""
+    if os.path.getsize(path) < RECORD_DTYPE.itemsize:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+
+    # A segment that is still being written ends in zero-filled records
+    if records["timestamp"][-1] == 0:
+        lo, hi = 0, len(records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if records["timestamp"][mid] == 0:
+                hi = mid
+            else:
+                lo = mid + 1
+        records = records[:lo]
+    return records
+
+
+def query(
+    start: float | None = None,
+    end: float | None = None,
+    device: str | None = None,
+    log_dir: str = config.PREDICTION_LOG_DIR,
+    name: str | None = None,
+):
+    """Return the records with start <= timestamp < end, optionally for one device.
+
+    Only segments of the writer `name` are read, which defaults to `device` since
+    the predictor names its log after the camera. Segments starting after `end`
+    are skipped by their file name, and the rest by their last record; within a
+    segment the records are in time order, so the range is found by binary search.
+    """
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    if name is None and device is not None:
+        name = device
+    if name is not None:
+        name = writer_name(name)
+
+    results = []
+    for first_timestamp, path in list_segments(log_dir, name):
+        if first_timestamp >= end:
+            # Segments are sorted by their first record
+            break
+        records = load_segment(path)
+        if len(records) == 0 or records["timestamp"][-1] < start:
+            continue
+        lo, hi = np.searchsorted(records["timestamp"], [start, end])
+        records = records[lo:hi]
+        if device is not None:
+            records = records[records["device"] == device.encode("utf-8")[:16]]
+        results.append(np.array(records))
+
+    if not results:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.concatenate(results)
+
+
+def downsample(records, interval: float):
+    """Average the records into buckets of `interval` seconds.
+
+    Returns the bucket start times, the mean prediction and whether the alarm
+    was raised in each bucket.
+    """
+    if not interval > 0:
+        raise ValueError(f"interval must be positive, got {interval}")
+    if len(records) == 0:
+        return np.empty(0), np.empty(0, dtype=np.float32), np.empty(0, dtype=bool)
+
+    buckets = np.floor(records["timestamp"] / interval).astype(np.int64)
+    keys, index, counts = np.unique(buckets, return_inverse=True, return_counts=True)
+    means = np.bincount(index, weights=records["prediction"]) / counts
+    alarms = np.bincount(index, weights=records["alarm"]) > 0
+    return keys * interval, means.astype(np.float32), alarms
@@ -1,17 +1,23 @@
 import os
+import queue
 from collections import deque
 from threading import Thread
 import time
 
 import cv2
-import matplotlib.pyplot as plt
 import torch
 
 import config
 import esp32cam
+from prediction_log import PredictionLog
 from model.train import EyeOpennessModel
 
 frame_counter = 0
+prediction_history = deque(maxlen=100)
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# user -> (modification time of the .pth, loaded model)
+_models = {}
+_graph_thread = None
 
 
 class Algorithm:
@@ -57,6 +63,9 @@ def preprocess_frame(frame):
 
 def update_graph():
     """Update the live graph."""
+    # Only needed for the live graph, and slow to import
+    import matplotlib.pyplot as plt
+
     plt.ion()
     fig, ax = plt.subplots()
     while True:
@@ -70,63 +79,109 @@ def update_graph():
         plt.pause(0.1)
 
 
-def main(esp: esp32cam.ESP32Cam, user: str):
-    global device, prediction_history, frame_counter
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+def start_graph():
+    """Start the live graph thread, once."""
+    global _graph_thread
+    if _graph_thread is None:
+        _graph_thread = Thread(target=update_graph, daemon=True)
+        _graph_thread.start()
+
+
+def load_model(user: str, warmup_runs: int = config.WARMUP_RUNS):
+    """Load the user's model, reusing the loaded one if the file is unchanged.
+
+    A freshly loaded model is run on dummy frames so the one-off allocation and
+    kernel selection costs are paid before the first real frame arrives.
+    """
+    path = os.path.join(config.TRAINED_MODELS_DIR, f"{user}.pth")
+    mtime = os.path.getmtime(path)
+    if user in _models and _models[user][0] == mtime:
+        return _models[user][1]
+
     model = EyeOpennessModel().to(device)
-    model.load_state_dict(
-        torch.load(
-            os.path.join(config.TRAINED_MODELS_DIR, f"{user}.pth"),
-            map_location=device,
-        )
-    )
+    model.load_state_dict(torch.load(path, map_location=device))
     model.eval()
 
+    dummy = torch.zeros(1, 3, 256, 256, device=device)
+    with torch.no_grad():
+        for _ in range(warmup_runs):
+            model(dummy)
+
+    _models[user] = (mtime, model)
+    print(f"Loaded model for {user}")
+    return model
+
+
+def main(esp: esp32cam.ESP32Cam, user: str):
+    """Run predictions on the camera stream until it disconnects.
+
+    Returns True if the user quit by pressing q.
+    """
+    global prediction_history, frame_counter
+    model = load_model(user)
+
     prediction_history = deque(maxlen=100)
+    prediction_log = PredictionLog(name=esp.ip)
+    is_sleepy = False
+    user_quit = False
 
-    graph_thread = Thread(target=update_graph, daemon=True)
-    graph_thread.start()
+    start_graph()
 
     frame_thread = Thread(target=esp.receive_packets, daemon=True)
     frame_thread.start()
 
-    while True:
-        if not esp.frame_queue.empty():
-            frame_data = esp.frame_queue.get()
-            frame = esp.process_frame(frame_data)
-            frame_counter += 1
-
-            if frame is not None:
-                input_tensor = preprocess_frame(frame)
-                with torch.no_grad():
-                    prediction = model(input_tensor).item()
-
-                prediction_history.append(prediction)
-
-                # Check if the user is sleepy every 100 frames
-                if frame_counter % 40 == 0:
-                    is_sleepy = Algorithm.simple_algorithm(prediction_history)
-                    if is_sleepy:
-                        print("User is sleepy!")
-                        esp.broadcast("GUY_DEAD", 5005)
-
-                # Overlay prediction on the frame
-                cv2.putText(
-                    frame,
-                    f"Prediction: {prediction:.2f}",
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    (0, 255, 0),
-                    2,
-                )
-
-                cv2.imshow("ESP32-CAM Live Stream", frame)
-
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-
-    cv2.destroyAllWindows()
+    try:
+        while esp.connected or not esp.frame_queue.empty():
+            if not esp.frame_queue.empty():
+                frame_data = esp.frame_queue.get()
+                frame = esp.process_frame(frame_data)
+                frame_counter += 1
+
+                if frame is not None:
+                    input_tensor = preprocess_frame(frame)
+                    with torch.no_grad():
+                        prediction = model(input_tensor).item()
+
+                    prediction_history.append(prediction)
+
+                    # Check if the user is sleepy every 100 frames
+                    if frame_counter % 40 == 0:
+                        is_sleepy = Algorithm.simple_algorithm(prediction_history)
+                        if is_sleepy:
+                            print("User is sleepy!")
+                            esp.broadcast(f"GUY_DEAD:{esp.ip}", 5005)
+
+                    prediction_log.log(esp.ip, prediction, esp.ir_status, is_sleepy)
+
+                    # Overlay prediction on the frame
+                    cv2.putText(
+                        frame,
+                        f"Prediction: {prediction:.2f}",
+                        (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        1,
+                        (0, 255, 0),
+                        2,
+                    )
+
+                    cv2.imshow("ESP32-CAM Live Stream", frame)
+
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        user_quit = True
+                        break
+    finally:
+        # Stop the receiver so it cannot take packets meant for the next handshake
+        esp.connected = False
+        while frame_thread.is_alive():
+            # It may be blocked on a full frame queue
+            try:
+                esp.frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+            frame_thread.join(timeout=0.1)
+        prediction_log.close()
+        cv2.destroyAllWindows()
+    return user_quit
 
 
 if __name__ == "__main__":
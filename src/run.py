@@ -1,11 +1,109 @@
 import argparse
+import importlib
+import sys
+import time
 
-import esp32cam
-import predictor
-from model import train
 import config
 
 
+def timed_import(*names):
+    """Import the modules a command needs, warning if it exceeds the budget.
+
+    torch, cv2 and friends are only imported by the commands that use them, so
+    parsing arguments and starting the lighter commands stays fast.
+    """
+    start = time.perf_counter()
+    modules = [importlib.import_module(name) for name in names]
+    elapsed = time.perf_counter() - start
+    if elapsed > config.IMPORT_TIME_BUDGET:
+        print(
+            f"Importing {', '.join(names)} took {elapsed:.2f}s "
+            f"(budget {config.IMPORT_TIME_BUDGET:.2f}s)"
+        )
+    return modules
+
+
+def connect(args):
+    (esp32cam,) = timed_import("esp32cam")
+    esp = esp32cam.ESP32Cam(ip=args.ip, port=args.port)
+    esp.handshake()
+    if not esp.connected:
+        print("Failed to connect to ESP32-CAM. Exiting.")
+        return None
+    return esp
+
+
+def record(args):
+    esp = connect(args)
+    if esp is None:
+        return
+    esp.stream(record=True, user=args.user)
+    esp.send("LED_0")
+
+
+def train(args):
+    (train_module,) = timed_import("model.train")
+    _, failed = train_module.train_all(
+        args.users or [args.user], args.workers, args.cache
+    )
+    if failed:
+        print(f"Training failed for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+def predict(args):
+    (predictor,) = timed_import("predictor")
+    esp = connect(args)
+    if esp is None:
+        return
+    predictor.main(esp, user=args.user)
+    esp.send("LED_0")
+
+
+def daemon(args):
+    """Keep the model loaded and serve whichever camera connects.
+
+    The model is loaded and warmed up before waiting for a camera, and is only
+    reloaded when its .pth file changes, so a reconnecting camera gets
+    predictions straight away.
+    """
+    # matplotlib is imported and the live graph started up front, so neither
+    # happens while the first camera's frames are coming in
+    esp32cam, predictor, _ = timed_import("esp32cam", "predictor", "matplotlib.pyplot")
+    predictor.load_model(args.user)
+    predictor.start_graph()
+    esp = esp32cam.ESP32Cam(ip=args.ip, port=args.port)
+
+    while True:
+        esp.handshake()
+        if not esp.connected:
+            continue
+        try:
+            if predictor.main(esp, user=args.user):
+                break
+            # Picks up a retrained model before the camera comes back
+            predictor.load_model(args.user)
+        except Exception as e:
+            # One bad session must not take the daemon down
+            print(f"Prediction session failed: {e!r}. Waiting for the camera.")
+        esp.connected = False
+    esp.send("LED_0")
+
+
+def run_all(args):
+    esp32cam, predictor, train_module = timed_import(
+        "esp32cam", "predictor", "model.train"
+    )
+    esp = connect(args)
+    if esp is None:
+        return
+
+    esp32cam.main(esp, user=args.user)
+    train_module.main(user=args.user)
+    predictor.main(esp, user=args.user)
+    esp.send("LED_0")
+
+
 def main():
     parser = argparse.ArgumentParser(description="ESP32-CAM Eye Openness Detection")
     parser.add_argument(
@@ -17,20 +115,37 @@ def main():
     parser.add_argument(
         "-p", "--port", type=int, default=config.PORT, help="Port number for UDP"
     )
+    parser.set_defaults(func=run_all)
 
-    esp = esp32cam.ESP32Cam(
-        ip=parser.parse_args().ip,
-        port=parser.parse_args().port,
+    subparsers = parser.add_subparsers(
+        title="commands", description="Run without a command to record, train and predict"
     )
-    esp.handshake()
-    if not esp.connected:
-        print("Failed to connect to ESP32-CAM. Exiting.")
-        return
+    subparsers.add_parser("record", help="Record frames for the user").set_defaults(
+        func=record
+    )
+    train_parser = subparsers.add_parser("train", help="Train models")
+    train_parser.add_argument(
+        "users", nargs="*", help="Users to train models for (default: --user)"
+    )
+    train_parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="Number of parallel trainings"
+    )
+    train_parser.add_argument(
+        "--cache",
+        type=int,
+        default=config.TRAIN_CACHE_IMAGES,
+        help="Decoded images each training keeps in memory (default: %(default)s)",
+    )
+    train_parser.set_defaults(func=train)
+    subparsers.add_parser("predict", help="Predict with a trained model").set_defaults(
+        func=predict
+    )
+    subparsers.add_parser(
+        "daemon", help="Keep the model loaded and predict for reconnecting cameras"
+    ).set_defaults(func=daemon)
 
-    esp32cam.main(esp)
-    train.main(user=parser.parse_args().user)
-    predictor.main(esp, user=parser.parse_args().user)
-    esp.send("LED_0")
+    args = parser.parse_args()
+    args.func(args)
 
 
 if __name__ == "__main__":
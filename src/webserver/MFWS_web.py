@@ -1,82 +1,274 @@
-from flask import Flask, jsonify, render_template
-from flask_cors import CORS  # Import Flask-CORS
+import os
+
+# Socket.IO worker: "threading" (default), "eventlet" or "gevent".
+# The green workers need the stdlib patched before anything else is imported.
+ASYNC_MODE = os.environ.get("MFWS_ASYNC_MODE", "threading")
+if ASYNC_MODE == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+elif ASYNC_MODE == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import ipaddress
 import socket
+import sys
 import threading
-# import os
+import time
+
+from flask import Flask, jsonify, render_template, request
+from flask_cors import CORS  # Import Flask-CORS
 # import pygame
 
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
+
+# The prediction log lives next to the predictor in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prediction_log
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-socketio = SocketIO(app, cors_allowed_origins="*")  # Allow all origins for WebSocket connections
+socketio = SocketIO(
+    app, cors_allowed_origins="*", async_mode=ASYNC_MODE
+)  # Allow all origins for WebSocket connections
 
 
 # UDP server configuration
 UDP_IP = "0.0.0.0"
 UDP_PORT = 5005
 BUFFER_SIZE = 1024
-alarm_triggered = False
 is_alarm_playing = False
 
+# Seconds between coalesced "buzzer_update" emits
+EMIT_INTERVAL = 0.1
+# Seconds of history /history returns when no range is given
+HISTORY_WINDOW = 3600
+# Room joined by supervisors that watch every device
+ALL_DEVICES_ROOM = "devices:all"
+# Alarms that do not say which camera they belong to
+UNKNOWN_DEVICE = "unknown"
+
+# device id -> {"buzzer_on": bool, "last_seen": float}
+devices = {}
+# device id -> latest state that has not been emitted yet
+pending_updates = {}
+state_lock = threading.Lock()
+
+send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+
+def device_room(device):
+    return f"device:{device}"
+
+
+def is_camera_ip(device):
+    try:
+        ipaddress.ip_address(device)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_message(message):
+    """Split "COMMAND[:camera ip]" into its parts.
+
+    Devices are identified by the IP address of their camera, which is the only
+    id the cameras can be addressed by. Messages that do not name a camera IP
+    (e.g. a bare "GUY_DEAD") are attributed to UNKNOWN_DEVICE.
+    """
+    command, _, device = message.partition(":")
+    if not is_camera_ip(device):
+        device = UNKNOWN_DEVICE
+    return command, device
+
+
+def devices_snapshot(device_ids=None):
+    with state_lock:
+        if device_ids is None:
+            return {device: dict(state) for device, state in devices.items()}
+        return {
+            device: dict(devices[device]) for device in device_ids if device in devices
+        }
+
+
+def set_buzzer_state(device, buzzer_on):
+    """Update a device's state and queue a frontend update if it changed."""
+    with state_lock:
+        state = devices.get(device)
+        changed = state is None or state["buzzer_on"] != buzzer_on
+        if state is None:
+            state = devices[device] = {"buzzer_on": buzzer_on, "last_seen": 0.0}
+        state["buzzer_on"] = buzzer_on
+        state["last_seen"] = time.time()
+        if changed:
+            pending_updates[device] = dict(state)
+
 
 def udp_listener():
-    global alarm_triggered
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow address reuse
     sock.bind((UDP_IP, UDP_PORT))
     print(f"Listening for UDP packets on {UDP_IP}:{UDP_PORT}...")
     while True:
         data, addr = sock.recvfrom(BUFFER_SIZE)
-        message = data.decode("utf-8")
-        print(f"Received message: {message}")
-        if message == "GUY_DEAD":
-            alarm_triggered = True
-            print("Buzzer state updated: ON")
-            # Notify the frontend via WebSocket
-            socketio.emit("buzzer_update", {"buzzer_on": True})
+        command, device = parse_message(data.decode("utf-8", errors="ignore"))
+        if command == "GUY_DEAD":
+            set_buzzer_state(device, True)
+            print(f"Buzzer state updated for {device}: ON")
+        elif command == "GUY_ALIVE" and device in devices:
+            set_buzzer_state(device, False)
 
 
-def broadcast_message(message):
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    sock.sendto(message.encode("utf-8"), ("255.255.255.255", UDP_PORT))
-    print(f"Broadcasted message: {message}")
+def emit_worker():
+    """Push queued device updates to the frontend.
+
+    Updates are coalesced for EMIT_INTERVAL seconds, so a device flapping between
+    states costs one emit per interval and each room gets a single batched message.
+    """
+    while True:
+        socketio.sleep(EMIT_INTERVAL)
+        with state_lock:
+            if not pending_updates:
+                continue
+            updates = pending_updates.copy()
+            pending_updates.clear()
+
+        # Notify the frontend via WebSocket
+        socketio.emit("buzzer_update", {"devices": updates}, to=ALL_DEVICES_ROOM)
+        for device, state in updates.items():
+            socketio.emit(
+                "buzzer_update", {"devices": {device: state}}, to=device_room(device)
+            )
+
+
+def send_message(message, device=None):
+    """Send a command to the camera at `device`, or broadcast it if no device is given."""
+    if device is None:
+        send_sock.sendto(message.encode("utf-8"), ("255.255.255.255", UDP_PORT))
+        print(f"Broadcasted message: {message}")
+    else:
+        send_sock.sendto(message.encode("utf-8"), (device, UDP_PORT))
+        print(f"Sent message: {message} to {device}")
+
+
+@socketio.on("subscribe")
+def subscribe(data=None):
+    """Join the rooms of the given devices, or of all devices if none are given."""
+    device_ids = (data or {}).get("devices")
+    if device_ids:
+        for device in device_ids:
+            join_room(device_room(device))
+    else:
+        join_room(ALL_DEVICES_ROOM)
+    socketio.emit(
+        "buzzer_update", {"devices": devices_snapshot(device_ids)}, to=request.sid
+    )
+
+
+@socketio.on("unsubscribe")
+def unsubscribe(data=None):
+    device_ids = (data or {}).get("devices")
+    if device_ids:
+        for device in device_ids:
+            leave_room(device_room(device))
+    else:
+        leave_room(ALL_DEVICES_ROOM)
+
 
 @app.route("/", methods=["GET"])
 def index():
     return render_template("MFWS_web.html")
 
+
+@app.route("/devices", methods=["GET"])
+def get_devices():
+    return jsonify(devices_snapshot())
+
+
+@app.route("/history/<device>", methods=["GET"])
+def get_history(device):
+    """Eye openness of a device from the prediction log.
+
+    Optional query parameters: start and end (unix time, default the last
+    HISTORY_WINDOW seconds), and interval (seconds per averaged point, default 1).
+    """
+    end = request.args.get("end", default=time.time(), type=float)
+    start = request.args.get("start", default=end - HISTORY_WINDOW, type=float)
+    interval = request.args.get("interval", default=1.0, type=float)
+    if not interval > 0:
+        return "interval must be positive", 400
+
+    records = prediction_log.query(start, end, device)
+    timestamps, predictions, alarms = prediction_log.downsample(records, interval)
+    return jsonify(
+        {
+            "timestamp": timestamps.tolist(),
+            "prediction": predictions.tolist(),
+            "alarm": alarms.tolist(),
+        }
+    )
+
+
 @app.route("/camera/start", methods=["GET"])
-def start_camera():
-    print("Sending camera start command")
-    broadcast_message("CAM_ON")
+@app.route("/camera/<device>/start", methods=["GET"])
+def start_camera(device=None):
+    if device is not None and not is_camera_ip(device):
+        return f"Not a camera IP: {device}", 400
+    print(f"Sending camera start command to {device or 'all cameras'}")
+    send_message("CAM_ON", device)
     return "Camera started", 200
 
 
 @app.route("/camera/stop", methods=["GET"])
-def stop_camera():
-    print("Sending camera stop command")
-    broadcast_message("CAM_OFF")
+@app.route("/camera/<device>/stop", methods=["GET"])
+def stop_camera(device=None):
+    if device is not None and not is_camera_ip(device):
+        return f"Not a camera IP: {device}", 400
+    print(f"Sending camera stop command to {device or 'all cameras'}")
+    send_message("CAM_OFF", device)
     return "Camera stopped", 200
 
 
 @app.route("/buzzer/state", methods=["GET"])
 def get_buzzer_state():
-    global alarm_triggered
-    return jsonify({"buzzer_on": alarm_triggered})
+    snapshot = devices_snapshot()
+    return jsonify(
+        {
+            "buzzer_on": any(state["buzzer_on"] for state in snapshot.values()),
+            "devices": snapshot,
+        }
+    )
 
 
 @app.route("/buzzer/stop", methods=["GET"])
-def stop_buzzer():
-    global alarm_triggered
-    alarm_triggered = False
-    print("Buzzer state updated: OFF")
-    # Broadcast "BUZZER_OFF" to the network
-    broadcast_message("GUY_ALIVE")
-    # Notify the frontend via WebSocket
-    socketio.emit("buzzer_update", {"buzzer_on": False})
+@app.route("/buzzer/<device>/stop", methods=["GET"])
+def stop_buzzer(device=None):
+    """Silence the buzzer of one camera, or every buzzer if no camera is given.
+
+    A buzzer only ignores other cameras' messages if its firmware is paired with
+    a camera (PAIRED_CAMERA_IP in ESP32_dashboard.ino); unpaired buzzers react
+    to every camera.
+    """
+    if device is None:
+        # Always reaches the buzzers, even ones the server has not heard from
+        send_message("GUY_ALIVE")
+        device_ids = list(devices_snapshot())
+    elif device == UNKNOWN_DEVICE:
+        send_message("GUY_ALIVE")
+        device_ids = [device]
+    elif is_camera_ip(device):
+        send_message(f"GUY_ALIVE:{device}")
+        device_ids = [device]
+    else:
+        return f"Not a camera IP: {device}", 400
+
+    for device_id in device_ids:
+        set_buzzer_state(device_id, False)
+        print(f"Buzzer state updated for {device_id}: OFF")
     return "Buzzer stopped", 200
 
 
@@ -114,5 +306,6 @@ def stop_buzzer():
 
 
 if __name__ == "__main__":
-    threading.Thread(target=udp_listener, daemon=True).start()
+    socketio.start_background_task(udp_listener)
+    socketio.start_background_task(emit_worker)
     socketio.run(app, host="0.0.0.0", port=8080, debug=True)
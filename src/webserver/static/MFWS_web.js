@@ -3,9 +3,25 @@ document.addEventListener("DOMContentLoaded", () => {
 
     let isAlarmPlaying = false;
 
+    // Devices supervised by this page, e.g. ?devices=192.168.1.20,192.168.1.21
+    // All devices are supervised when none are given.
+    const params = new URLSearchParams(window.location.search);
+    const supervisedDevices = (params.get("devices") || "").split(",").filter(d => d);
+    const deviceStates = {};
+
+    // Camera commands go to the supervised devices only, or to every camera
+    function cameraUrls(action) {
+        if (supervisedDevices.length === 0) {
+            return [`http://localhost:8080/camera/${action}`];
+        }
+        return supervisedDevices.map(
+            device => `http://localhost:8080/camera/${encodeURIComponent(device)}/${action}`
+        );
+    }
+
     // Camera Start Button
     document.getElementById("cameraStartButton").addEventListener("click", () => {
-        fetch("http://localhost:8080/camera/start")
+        cameraUrls("start").forEach(url => fetch(url)
             .then(response => {
                 if (response.ok) {
                     alert("Camera started!");
@@ -13,12 +29,12 @@ document.addEventListener("DOMContentLoaded", () => {
                     alert("Failed to start the camera.");
                 }
             })
-            .catch(error => console.error("Error:", error));
+            .catch(error => console.error("Error:", error)));
     });
 
     // Camera Stop Button
     document.getElementById("cameraStopButton").addEventListener("click", () => {
-        fetch("http://localhost:8080/camera/stop")
+        cameraUrls("stop").forEach(url => fetch(url)
             .then(response => {
                 if (response.ok) {
                     alert("Camera stopped!");
@@ -26,56 +42,65 @@ document.addEventListener("DOMContentLoaded", () => {
                     alert("Failed to stop the camera.");
                 }
             })
-            .catch(error => console.error("Error:", error));
+            .catch(error => console.error("Error:", error)));
     });
 
     // Connect to the WebSocket server
     const socket = io("http://localhost:8080");
 
-    // Listen for buzzer updates
-    socket.on("buzzer_update", (data) => {
-        const buzzerState = document.getElementById("buzzerState");
-        const buzzerOffButton = document.getElementById("buzzerOffButton");
+    socket.on("connect", () => {
+        // Only receive updates for the supervised devices
+        socket.emit("subscribe", { devices: supervisedDevices });
+    });
 
-        if (data.buzzer_on) {
-            buzzerState.textContent = "Buzzer is ON";
-            buzzerOffButton.disabled = false;
-        } else {
-            buzzerState.textContent = "Buzzer is OFF";
-            buzzerOffButton.disabled = true;
-        }
+    // Listen for buzzer updates, batched as { devices: { id: state } }
+    socket.on("buzzer_update", (data) => {
+        Object.assign(deviceStates, data.devices);
+        renderDevices();
     });
 
     // Buzzer Off Button
     document.getElementById("buzzerOffButton").addEventListener("click", () => {
-        fetch("http://localhost:8080/buzzer/stop")
+        Object.keys(deviceStates)
+            .filter(device => deviceStates[device].buzzer_on)
+            .forEach(stopBuzzer);
+    });
+
+    function stopBuzzer(device) {
+        fetch(`http://localhost:8080/buzzer/${encodeURIComponent(device)}/stop`)
             .then(response => {
-                if (response.ok) {
-                    alert("Buzzer turned off!");
-                } else {
-                    alert("Failed to turn off the buzzer.");
+                if (!response.ok) {
+                    alert(`Failed to turn off the buzzer for ${device}.`);
                 }
             })
             .catch(error => console.error("Error:", error));
-    });
+    }
 
-    // Function to fetch the buzzer state
-    function fetchBuzzerState() {
-        fetch("http://localhost:8080/buzzer/state")
-            .then(response => response.json())
-            .then(data => {
-                const buzzerState = document.getElementById("buzzerState");
-                const buzzerOffButton = document.getElementById("buzzerOffButton");
-
-                if (data.buzzer_on) {
-                    buzzerState.textContent = "Buzzer is ON";
-                    buzzerOffButton.disabled = false;
-                } else {
-                    buzzerState.textContent = "Buzzer is OFF";
-                    buzzerOffButton.disabled = true;
-                }
-            })
-            .catch(error => console.error("Error fetching buzzer state:", error));
+    function renderDevices() {
+        const deviceList = document.getElementById("deviceList");
+        const buzzerState = document.getElementById("buzzerState");
+        const buzzerOffButton = document.getElementById("buzzerOffButton");
+        let anyBuzzerOn = false;
+
+        deviceList.replaceChildren();
+        Object.keys(deviceStates).sort().forEach(device => {
+            const state = deviceStates[device];
+            anyBuzzerOn = anyBuzzerOn || state.buzzer_on;
+
+            const entry = document.createElement("div");
+            entry.className = "device";
+            const label = document.createElement("p");
+            label.textContent = `${device}: Buzzer is ${state.buzzer_on ? "ON" : "OFF"}`;
+            const button = document.createElement("button");
+            button.textContent = "Turn Buzzer Off";
+            button.disabled = !state.buzzer_on;
+            button.addEventListener("click", () => stopBuzzer(device));
+            entry.append(label, button);
+            deviceList.append(entry);
+        });
+
+        buzzerState.textContent = anyBuzzerOn ? "Buzzer is ON" : "Buzzer is OFF";
+        buzzerOffButton.disabled = !anyBuzzerOn;
     }
 
     // document.getElementById("alarmButton").addEventListener("click", () => {